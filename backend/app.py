@@ -1,31 +1,87 @@
 import os
+
+from dotenv import load_dotenv
+
+# Load environment variables from .env file. Must happen before the gevent
+# check below so .env can select the async mode too; dotenv does no socket
+# work, so patching after it is safe.
+load_dotenv()
+
+# Must run before anything else pulls in the stdlib networking modules.
+# Production sets SOCKETIO_ASYNC_MODE=gevent (Gunicorn gevent worker);
+# plain `python app.py` stays on the unpatched threading mode.
+SOCKETIO_ASYNC_MODE = os.environ.get('SOCKETIO_ASYNC_MODE', 'threading')
+if SOCKETIO_ASYNC_MODE == 'gevent':
+    from gevent import monkey
+    monkey.patch_all()
+
 import asyncio
-import json
+import atexit
+import orjson
+import re
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from flask import Flask, request
 from flask_socketio import SocketIO, emit, join_room, leave_room
 from flask_cors import CORS
-from dotenv import load_dotenv
+from cache import LLMCache, cache_key
+import ijson
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import logging
 from datetime import datetime
 import threading
 import time
-
-# Load environment variables from .env file
-load_dotenv()
+import uuid
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+def _now_iso():
+    """Timestamp for events - computed once per handler, reused per emit"""
+    return datetime.utcnow().isoformat(timespec='milliseconds') + 'Z'
+
+class _OrjsonShim:
+    """json-module interface over orjson for the Socket.IO serializer"""
+
+    @staticmethod
+    def dumps(obj, *args, **kwargs):
+        return orjson.dumps(obj).decode()
+
+    @staticmethod
+    def loads(s, *args, **kwargs):
+        return orjson.loads(s)
+
+
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'your-secret-key-here')
 
-# Enable CORS for all routes
-CORS(app)
+# Allow only the configured frontend origins instead of a wildcard wrap
+# around every route
+ALLOWED_ORIGINS = os.environ.get('CORS_ORIGINS', 'http://localhost:8501').split(',')
+CORS(app, origins=ALLOWED_ORIGINS)
+
+# Optional Redis: when REDIS_URL is set it becomes the Socket.IO message
+# queue (so emits fan out across multiple workers) and presence is mirrored
+# into Redis so it survives restarts and is visible to other processes.
+REDIS_URL = os.environ.get('REDIS_URL')
+redis_client = None
+if REDIS_URL:
+    try:
+        from redis import Redis
+        redis_client = Redis.from_url(REDIS_URL)
+        redis_client.ping()
+    except Exception as e:
+        logging.getLogger(__name__).warning(f"⚠️ Redis unavailable ({e}) - running single-process")
+        redis_client = None
 
-# Initialize SocketIO with proper CORS settings
-socketio = SocketIO(app, cors_allowed_origins="*",async_mode='threading',) 
+# Initialize SocketIO with proper CORS settings. The async mode was read
+# (and gevent monkey-patched if selected) at the very top of the module.
+socketio = SocketIO(app, cors_allowed_origins=ALLOWED_ORIGINS, async_mode=SOCKETIO_ASYNC_MODE,
+                    message_queue=REDIS_URL if redis_client else None,
+                    json=_OrjsonShim, always_connect=True)
 
 # Ollama configuration
 OLLAMA_HOST = os.environ.get('OLLAMA_HOST', 'localhost')
@@ -33,9 +89,138 @@ OLLAMA_PORT = os.environ.get('OLLAMA_PORT', '11434')
 OLLAMA_URL = f"http://{OLLAMA_HOST}:{OLLAMA_PORT}"
 MODEL_NAME = os.environ.get('MODEL_NAME', 'llama3.2')
 
-# Store active users and rooms
+# Shared HTTP session for all Ollama calls: keep-alive connections are
+# reused instead of paying a TCP handshake per call, and the pool size caps
+# concurrency against Ollama
+OLLAMA = requests.Session()
+OLLAMA.mount("http://", HTTPAdapter(
+    pool_connections=8,
+    pool_maxsize=16,
+    max_retries=Retry(total=2, backoff_factor=0.2, status_forcelist=[502, 503, 504])
+))
+
+# Store active users and rooms. Membership is a set per room so contains,
+# add, and remove are O(1) instead of scanning a list.
 active_users = {}
-chat_rooms = {'general': [], 'tech': [], 'random': []}
+chat_rooms = {'general': set(), 'tech': set(), 'random': set()}
+
+# Derived view: usernames per room, updated eagerly on join/leave so room
+# listings are a direct read instead of an O(users) rebuild per request
+room_users = defaultdict(list)
+_state_lock = threading.Lock()
+
+def _redis_track_join(sid, username, room, joined_at):
+    """Mirror a join into Redis so presence survives restarts (best effort)"""
+    if redis_client is None:
+        return
+    try:
+        redis_client.hset(f"user:{sid}", mapping={
+            'username': username, 'room': room, 'joined_at': joined_at})
+        redis_client.expire(f"user:{sid}", 3600)
+        redis_client.sadd(f"room:{room}", sid)
+    except Exception as e:
+        logger.warning(f"⚠️ Redis presence update failed: {e}")
+
+def _redis_track_leave(sid, room):
+    """Mirror a leave/disconnect into Redis (best effort)"""
+    if redis_client is None:
+        return
+    try:
+        redis_client.srem(f"room:{room}", sid)
+        redis_client.delete(f"user:{sid}")
+    except Exception as e:
+        logger.warning(f"⚠️ Redis presence update failed: {e}")
+
+def _rooms_snapshot():
+    """Room membership as {room: {user_count, users}}.
+
+    Read from the Redis presence mirror when available, so the view spans
+    every worker process and restarts; otherwise from the local dicts.
+    """
+    if redis_client is not None:
+        try:
+            rooms = set(chat_rooms)
+            for key in redis_client.scan_iter(match='room:*'):
+                rooms.add(key.decode().split(':', 1)[1])
+            snapshot = {}
+            for room in rooms:
+                sids = redis_client.smembers(f"room:{room}")
+                pipe = redis_client.pipeline()
+                for sid in sids:
+                    pipe.hgetall(f"user:{sid.decode()}")
+                users = [u[b'username'].decode() for u in pipe.execute()
+                         if u and b'username' in u]
+                snapshot[room] = {'user_count': len(users), 'users': users}
+            return snapshot
+        except Exception as e:
+            logger.warning(f"⚠️ Redis presence read failed: {e}")
+    with _state_lock:
+        return {
+            room: {'user_count': len(room_users[room]), 'users': list(room_users[room])}
+            for room in chat_rooms
+        }
+
+# Bounded worker pool for AI generation, sized to Ollama's real concurrency.
+# A burst of @ai messages queues here instead of spawning a thread (and an
+# Ollama request) per message.
+AI_EXECUTOR = ThreadPoolExecutor(
+    max_workers=int(os.environ.get('AI_WORKERS', 4)),
+    thread_name_prefix='ai'
+)
+atexit.register(AI_EXECUTOR.shutdown, wait=False)
+
+# In-flight AI requests per room, so a busy room gets a notice instead of
+# piling more work onto the queue. Defaults to 1 because streamed chunks
+# carry no message id - clients append them to the latest AI bubble, so
+# concurrent generations in one room would interleave into it
+MAX_AI_IN_FLIGHT_PER_ROOM = int(os.environ.get('AI_MAX_IN_FLIGHT_PER_ROOM', 1))
+_ai_in_flight = defaultdict(int)
+_ai_in_flight_lock = threading.Lock()
+
+# Repeated questions come back from cache instead of a multi-second generation
+llm_cache = LLMCache(redis_client)
+
+# Matches an @ai mention at the start of a message or after whitespace,
+# case-insensitively, in one C-level pass without lowercasing copies
+_AI_RE = re.compile(r'(?i)(?:^|\s)@ai\b')
+
+# Per-room conversation history (last N turns) fed to /api/chat as a stable
+# messages prefix, so Ollama can reuse its prompt KV cache across turns.
+# Kept in Redis when available so it is shared across workers.
+HISTORY_TURNS = 20
+
+_local_history = defaultdict(list)
+_history_lock = threading.Lock()
+
+def _get_history(room):
+    """Return the room's recent conversation as a list of role/content dicts"""
+    if redis_client is not None:
+        try:
+            raw = redis_client.lrange(f"history:{room}", -2 * HISTORY_TURNS, -1)
+            return [orjson.loads(m) for m in raw]
+        except Exception as e:
+            logger.warning(f"⚠️ Redis history read failed: {e}")
+    with _history_lock:
+        return list(_local_history[room])
+
+def _append_history(room, prompt, reply):
+    """Record one completed turn, keeping only the last HISTORY_TURNS"""
+    user_msg = {"role": "user", "content": prompt}
+    ai_msg = {"role": "assistant", "content": reply}
+    if redis_client is not None:
+        try:
+            key = f"history:{room}"
+            pipe = redis_client.pipeline()
+            pipe.rpush(key, orjson.dumps(user_msg), orjson.dumps(ai_msg))
+            pipe.ltrim(key, -2 * HISTORY_TURNS, -1)
+            pipe.execute()
+            return
+        except Exception as e:
+            logger.warning(f"⚠️ Redis history write failed: {e}")
+    with _history_lock:
+        history = _local_history[room]
+        history.extend([user_msg, ai_msg])
+        del history[:-2 * HISTORY_TURNS]
 
 def wait_for_ollama():
     """Wait for Ollama to be ready"""
@@ -44,7 +229,7 @@ def wait_for_ollama():
     
     while retry_count < max_retries:
         try:
-            response = requests.get(f"{OLLAMA_URL}/api/tags", timeout=5)
+            response = OLLAMA.get(f"{OLLAMA_URL}/api/tags", timeout=5)
             if response.status_code == 200:
                 logger.info("✅ Ollama is ready!")
                 return True
@@ -56,87 +241,176 @@ def wait_for_ollama():
     logger.warning("⚠️ Failed to connect to Ollama after maximum retries")
     return False
 
+# Set when pulling the model ultimately failed, so AI requests fail fast
+# instead of hitting Ollama with a model that is not there
+_model_unavailable = threading.Event()
+
 def pull_model():
     """Pull the required model if not available"""
-    attempt=0
-    start_time=time.time()
+    t0 = time.monotonic()
     try:
-        # Check if model exists
-        response = requests.get(f"{OLLAMA_URL}/api/tags", timeout=10)
-        if response.status_code == 200:
-            models = response.json().get('models', [])
-            model_names = [model['name'] for model in models]
-            
-            if MODEL_NAME not in model_names and f"{MODEL_NAME}:latest" not in model_names:
-                    while attempt <= 2:
-                        attempt += 1
-                        try:
-                            logger.info(f"📥 Pulling model {MODEL_NAME} (attempt {attempt})...")
-                            pr = requests.post(
-                                f"{OLLAMA_URL}/api/pull",
-                                json={"name": MODEL_NAME},
-                                stream=True,
-                                timeout=600,  # Increased timeout for large models
-                            )
-                            pr.raise_for_status()
-                            # Drain the stream without logging each line
-                            for _ in pr.iter_lines():
-                                pass
-
-                            total = time.time() - start_time
-                            logger.info(f"✅ Model {MODEL_NAME} pulled successfully in {total:.1f}s (after {attempt} attempt(s))")
-                            return True
-
-                        except (requests.exceptions.Timeout, requests.exceptions.RequestException) as e:
-                            now = time.time()-start_time
-                            start_time = time.time()
-                            logger.warning(f"⏳ Pull attempt {attempt} failed: {e} — in {now:.1f}s")
-
-                    # If we exit the loop, we ran out of time
-                    elapsed = time.time() - start_time
-                    logger.error(f"❌ Failed to pull model {MODEL_NAME} within {elapsed:.1f}s")
-                    return False
-            else:
-                logger.info(f"✅ Model {MODEL_NAME} already available")
-                
+        # Check if model exists: scan the tag list incrementally and stop at
+        # the first match instead of materializing every model entry. Closing
+        # the response early hands the connection back to the pool.
+        found = False
+        with OLLAMA.get(f"{OLLAMA_URL}/api/tags", timeout=10, stream=True) as response:
+            if response.status_code != 200:
+                return False
+            response.raw.decode_content = True
+            for name in ijson.items(response.raw, 'models.item.name'):
+                if name == MODEL_NAME or name == f"{MODEL_NAME}:latest":
+                    found = True
+                    break
+
+        if found:
+            logger.info(f"✅ Model {MODEL_NAME} already available")
+            _model_unavailable.clear()
+            return True
+
+        for attempt in range(1, 4):
+            try:
+                logger.info(f"📥 Pulling model {MODEL_NAME} (attempt {attempt})...")
+                with OLLAMA.post(
+                    f"{OLLAMA_URL}/api/pull",
+                    data=orjson.dumps({"name": MODEL_NAME}),
+                    headers={'Content-Type': 'application/json'},
+                    stream=True,
+                    timeout=600,  # Increased timeout for large models
+                ) as pr:
+                    pr.raise_for_status()
+                    # Drain the progress stream as raw 64 KiB byte
+                    # chunks - no per-line decode or gzip inflation
+                    # for megabytes of JSON we never look at
+                    pr.raw.decode_content = False
+                    for _ in pr.iter_content(chunk_size=65536):
+                        pass
+
+                total = time.monotonic() - t0
+                logger.info(f"✅ Model {MODEL_NAME} pulled successfully in {total:.1f}s (after {attempt} attempt(s))")
+                _model_unavailable.clear()
+                return True
+
+            except requests.exceptions.RequestException as e:
+                logger.warning(f"⏳ Pull attempt {attempt} failed after {time.monotonic() - t0:.1f}s: {e}")
+                # Back off exponentially between attempts instead of
+                # hammering Ollama - but not after the final one
+                if attempt < 3:
+                    time.sleep(min(2 ** attempt, 30))
+
+        # If we exit the loop, all attempts failed
+        elapsed = time.monotonic() - t0
+        logger.error(f"❌ Failed to pull model {MODEL_NAME} within {elapsed:.1f}s")
+        _model_unavailable.set()
+        return False
+
     except Exception as e:
         logger.error(f"❌ Error pulling model: {e}")
 
-def generate_llm_response(prompt, conversation_history=""):
-    """Generate response from Ollama LLM"""
+def generate_llm_response(prompt, room, msg_id):
+    """Stream a response from the Ollama LLM into a room.
+
+    Emits 'message_chunk' events tagged with msg_id so clients can route
+    tokens to the right message as they arrive, then returns
+    (text, cache_hit) so the caller can send the final 'message_end' event.
+    On a cache hit the full text is returned immediately without touching
+    Ollama.
+    """
+    if _model_unavailable.is_set():
+        return "Sorry, the AI model could not be downloaded, so AI responses are disabled.", False
+
     try:
-        # Prepare the full context
-        full_prompt = f"{conversation_history}\nUser: {prompt}\nAssistant:"
-        
+        # Structured conversation: the room history is a stable prefix, so
+        # Ollama's prompt KV cache only evaluates the new turn
+        messages = _get_history(room) + [{"role": "user", "content": prompt}]
+
+        options = {
+            "temperature": 0.7,
+            "num_predict": 500
+        }
+
+        # Repeated questions collapse to a cache lookup. Keyed on the prompt
+        # alone, not the full messages array - including the ever-growing
+        # history would make every repeat a unique key and the cache useless.
+        # The trade-off is that cached answers ignore conversation context.
+        key = cache_key(MODEL_NAME, prompt, options)
+        cached = llm_cache.get(key)
+        if cached is not None:
+            logger.info("⚡ LLM cache hit")
+            _append_history(room, prompt, cached)
+            return cached, True
+
         payload = {
             "model": MODEL_NAME,
-            "prompt": full_prompt,
-            "stream": False,
-            "options": {
-                "temperature": 0.7,
-                "num_predict": 500
-            }
+            "messages": messages,
+            "stream": True,
+            "options": options,
+            # Keep the model loaded between requests - unloading costs
+            # seconds of reload on the next question
+            "keep_alive": "30m"
         }
-        
-        response = requests.post(
-            f"{OLLAMA_URL}/api/generate",
-            json=payload,
-            timeout=30
-        )
-        
-        if response.status_code == 200:
-            result = response.json()
-            return result.get('response', 'Sorry, I could not generate a response.')
-        else:
-            logger.error(f"❌ Ollama API error: {response.status_code}")
-            return "Sorry, I'm having trouble connecting to the AI model."
-            
+
+        parts = []
+        # Coalesce tokens before emitting: one Socket.IO frame per 64 chars
+        # or 50 ms, whichever comes first, instead of a frame per token
+        buf = []
+        buffered = 0
+        last_flush = time.monotonic()
+        with OLLAMA.post(
+            f"{OLLAMA_URL}/api/chat",
+            data=orjson.dumps(payload),
+            headers={'Content-Type': 'application/json'},
+            stream=True,
+            timeout=(5, None)
+        ) as response:
+            if response.status_code != 200:
+                logger.error(f"❌ Ollama API error: {response.status_code}")
+                return "Sorry, I'm having trouble connecting to the AI model.", False
+
+            for line in response.iter_lines(decode_unicode=False):
+                if not line:
+                    continue
+                chunk = orjson.loads(line)
+                token = chunk.get('message', {}).get('content', '')
+                if token:
+                    parts.append(token)
+                    buf.append(token)
+                    buffered += len(token)
+                    now = time.monotonic()
+                    if buffered >= 64 or now - last_flush >= 0.05:
+                        socketio.emit('message_chunk', {
+                            'id': msg_id,
+                            'username': 'AI Assistant',
+                            'token': ''.join(buf),
+                            'room': room
+                        }, room=room)
+                        buf.clear()
+                        buffered = 0
+                        last_flush = now
+                if chunk.get('done'):
+                    break
+
+        # Flush whatever is left at stream end
+        if buf:
+            socketio.emit('message_chunk', {
+                'id': msg_id,
+                'username': 'AI Assistant',
+                'token': ''.join(buf),
+                'room': room
+            }, room=room)
+
+        text = ''.join(parts)
+        if text:
+            llm_cache.set(key, text)
+            _append_history(room, prompt, text)
+            return text, False
+        return 'Sorry, I could not generate a response.', False
+
     except requests.exceptions.Timeout:
         logger.error("⏰ Ollama API timeout")
-        return "Sorry, the AI model is taking too long to respond."
+        return "Sorry, the AI model is taking too long to respond.", False
     except Exception as e:
         logger.error(f"❌ Error generating LLM response: {e}")
-        return "Sorry, I encountered an error while generating a response."
+        return "Sorry, I encountered an error while generating a response.", False
 
 @socketio.on('connect')
 def handle_connect():
@@ -154,19 +428,30 @@ def handle_disconnect():
         room = user_info['room']
         
         # Remove from room
-        if room in chat_rooms and request.sid in chat_rooms[room]:
-            chat_rooms[room].remove(request.sid)
-            logger.info(f"👋 Removed {username} from room {room}")
-        
-        # Remove from active users
-        del active_users[request.sid]
-        
-        # Notify room about user leaving
+        with _state_lock:
+            if room in chat_rooms:
+                chat_rooms[room].discard(request.sid)
+                logger.info(f"👋 Removed {username} from room {room}")
+            if username in room_users[room]:
+                room_users[room].remove(username)
+
+            # Remove from active users
+            del active_users[request.sid]
+        _redis_track_leave(request.sid, room)
+
+        # Notify room about user leaving, with the updated snapshot so
+        # remaining clients don't have to refetch membership
         emit('user_left', {
             'username': username,
-            'timestamp': datetime.now().isoformat()
+            'timestamp': _now_iso()
         }, room=room)
-        
+        users = list(room_users[room])
+        emit('room_info', {
+            'room': room,
+            'users': users,
+            'user_count': len(users)
+        }, room=room)
+
         logger.info(f"👋 User {username} left room {room}")
     
     print(f"❌ Client {request.sid} disconnected")
@@ -187,53 +472,66 @@ def handle_join(data):
     # Remove user from previous room if they were in one
     if request.sid in active_users:
         old_room = active_users[request.sid]['room']
-        if old_room in chat_rooms and request.sid in chat_rooms[old_room]:
-            chat_rooms[old_room].remove(request.sid)
-            leave_room(old_room)
-            logger.info(f"🔄 Moved {username} from {old_room} to {room}")
-    
+        with _state_lock:
+            if old_room in chat_rooms and request.sid in chat_rooms[old_room]:
+                chat_rooms[old_room].discard(request.sid)
+                old_username = active_users[request.sid]['username']
+                if old_username in room_users[old_room]:
+                    room_users[old_room].remove(old_username)
+        leave_room(old_room)
+        _redis_track_leave(request.sid, old_room)
+
+        # Tell the old room its membership changed
+        old_users = list(room_users[old_room])
+        emit('room_info', {
+            'room': old_room,
+            'users': old_users,
+            'user_count': len(old_users)
+        }, room=old_room)
+        logger.info(f"🔄 Moved {username} from {old_room} to {room}")
+
     # Store user info
-    active_users[request.sid] = {
-        'username': username,
-        'room': room,
-        'joined_at': datetime.now().isoformat()
-    }
-    
-    # Add to room
+    joined_at = _now_iso()
+    with _state_lock:
+        active_users[request.sid] = {
+            'username': username,
+            'room': room,
+            'joined_at': joined_at
+        }
+
+        # Add to room and keep the derived username view in step
+        members = chat_rooms.setdefault(room, set())
+        if request.sid not in members:
+            members.add(request.sid)
+            room_users[room].append(username)
+
     join_room(room)
-    if room not in chat_rooms:
-        chat_rooms[room] = []
-    
-    if request.sid not in chat_rooms[room]:
-        chat_rooms[room].append(request.sid)
-    
+    _redis_track_join(request.sid, username, room, joined_at)
+
     # Send welcome message to user first
     emit('message', {
         'username': 'System',
         'message': f'Welcome to {room} room, {username}!',
-        'timestamp': datetime.now().isoformat(),
+        'timestamp': joined_at,
         'type': 'system'
     })
     
     # Notify room about new user (exclude the user who just joined)
     emit('user_joined', {
         'username': username,
-        'timestamp': datetime.now().isoformat()
+        'timestamp': joined_at
     }, room=room, include_self=False)
     
-    # Send room info to user
-    room_users = []
-    for sid in chat_rooms[room]:
-        if sid in active_users:
-            room_users.append(active_users[sid]['username'])
-    
+    # Broadcast one membership snapshot to the whole room - built once,
+    # delivered to everyone, so clients never have to refetch it
+    users = list(room_users[room])
     emit('room_info', {
         'room': room,
-        'users': room_users,
-        'user_count': len(room_users)
-    })
-    
-    logger.info(f"✅ User {username} successfully joined room {room}. Room now has {len(room_users)} users.")
+        'users': users,
+        'user_count': len(users)
+    }, room=room)
+
+    logger.info(f"✅ User {username} successfully joined room {room}. Room now has {len(users)} users.")
 
 @socketio.on('message')
 def handle_message(data):
@@ -251,7 +549,7 @@ def handle_message(data):
         emit('error', {'msg': 'Message cannot be empty'})
         return
     
-    timestamp = datetime.now().isoformat()
+    timestamp = _now_iso()
     
     # Broadcast user message to room
     message_data = {
@@ -265,31 +563,51 @@ def handle_message(data):
     logger.info(f"💬 Message from {username} in {room}: {message[:50]}...")
     
     # Check if message is directed to AI
-    should_trigger_ai = (
-        message.lower().startswith('@ai') or 
-        '@ai' in message.lower())
+    should_trigger_ai = _AI_RE.search(message) is not None
     
     if should_trigger_ai:
-        # Generate AI response in a separate thread
+        with _ai_in_flight_lock:
+            if _ai_in_flight[room] >= MAX_AI_IN_FLIGHT_PER_ROOM:
+                emit('message', {
+                    'username': 'AI Assistant',
+                    'message': 'I am busy answering other questions in this room right now, please try again in a moment.',
+                    'timestamp': timestamp,
+                    'type': 'ai'
+                }, room=room)
+                return
+            _ai_in_flight[room] += 1
+
+        # Generate AI response on the shared worker pool
         def generate_and_send_ai_response():
             try:
                 # Prepare AI prompt
-                ai_prompt = message.replace('@ai', '').strip()
+                ai_prompt = _AI_RE.sub('', message, count=1).strip()
                 if not ai_prompt:
                     ai_prompt = message
                 
                 logger.info(f"🤖 Generating AI response for: {ai_prompt[:50]}...")
-                ai_response = generate_llm_response(ai_prompt)
-                
-                # Send AI response
-                ai_message_data = {
+
+                # Tell clients a streamed AI message is starting; the id
+                # lets them route the chunks that follow to this message
+                msg_id = uuid.uuid4().hex
+                socketio.emit('message_start', {
+                    'id': msg_id,
                     'username': 'AI Assistant',
-                    'message': ai_response,
-                    'timestamp': datetime.now().isoformat(),
+                    'timestamp': _now_iso(),
                     'type': 'ai'
-                }
-                
-                socketio.emit('message', ai_message_data, room=room)
+                }, room=room)
+
+                ai_response, cache_hit = generate_llm_response(ai_prompt, room, msg_id)
+
+                # Close the stream with the full text so clients can reconcile
+                socketio.emit('message_end', {
+                    'id': msg_id,
+                    'username': 'AI Assistant',
+                    'message': ai_response,
+                    'timestamp': _now_iso(),
+                    'type': 'ai',
+                    'cache': 'hit' if cache_hit else 'miss'
+                }, room=room)
                 logger.info(f"🤖 AI response sent to room {room}")
                 
             except Exception as e:
@@ -297,67 +615,70 @@ def handle_message(data):
                 error_message = {
                     'username': 'AI Assistant',
                     'message': 'Sorry, I encountered an error while processing your request.',
-                    'timestamp': datetime.now().isoformat(),
+                    'timestamp': _now_iso(),
                     'type': 'ai'
                 }
                 socketio.emit('message', error_message, room=room)
-        
-        # Start AI response generation in background
-        ai_thread = threading.Thread(target=generate_and_send_ai_response, daemon=True).start()
+            finally:
+                with _ai_in_flight_lock:
+                    _ai_in_flight[room] -= 1
+
+        AI_EXECUTOR.submit(generate_and_send_ai_response)
 
 @socketio.on('get_rooms')
 def handle_get_rooms():
     """Get list of available rooms"""
-    rooms_info = {}
-    for room, user_sids in chat_rooms.items():
-        active_users_in_room = [active_users[sid]['username'] for sid in user_sids if sid in active_users]
-        rooms_info[room] = {
-            'user_count': len(active_users_in_room),
-            'users': active_users_in_room
-        }
-    
-    emit('rooms_list', rooms_info)
+    emit('rooms_list', _rooms_snapshot())
 
 @app.route('/health')
 def health_check():
     return {
-        'status': 'healthy', 'timestamp': datetime.now().isoformat()}
+        'status': 'healthy', 'timestamp': _now_iso()}
+
+# Last-known Ollama status, refreshed by a background poll so the status
+# route answers from memory instead of a live call on the request path
+_ollama_status = {'status': 'unknown'}
+
+def _poll_ollama():
+    """Refresh the cached Ollama status every 5 seconds"""
+    global _ollama_status
+    while True:
+        try:
+            response = OLLAMA.get(f"{OLLAMA_URL}/api/tags", timeout=5)
+            if response.status_code == 200:
+                _ollama_status = {'status': 'connected', 'models': response.json()}
+            else:
+                _ollama_status = {'status': 'error', 'code': response.status_code}
+        except Exception as e:
+            _ollama_status = {'status': 'disconnected', 'error': str(e)}
+        socketio.sleep(5)
 
 @app.route('/ollama-status')
 def ollama_status():
-    try:
-        response = requests.get(f"{OLLAMA_URL}/api/tags", timeout=5)
-        if response.status_code == 200:
-            return {'status': 'connected', 'models': response.json()}
-        else:
-            return {'status': 'error', 'code': response.status_code}
-    except Exception as e:
-        return {'status': 'disconnected', 'error': str(e)}
+    return _ollama_status
 
 @app.route('/rooms')
 def get_rooms():
     """REST endpoint to get room information"""
-    rooms_info = {}
-    for room, user_sids in chat_rooms.items():
-        active_users_in_room = [active_users[sid]['username'] for sid in user_sids if sid in active_users]
-        rooms_info[room] = {
-            'user_count': len(active_users_in_room),
-            'users': active_users_in_room
-        }
-    
-    return rooms_info
+    return _rooms_snapshot()
 
-if __name__ == '__main__':
-    logger.info("🚀 Starting Ollama Chat Server...")
-    
-    # Wait for Ollama to be ready (optional - can start without Ollama)
+def _startup():
+    """Wait for Ollama and pull the model (optional - can run without Ollama)"""
     if wait_for_ollama():
-        # Pull required model
         pull_model()
         logger.info("Ollama is ready and model is available")
     else:
         logger.warning("Starting server without Ollama - AI features will be disabled")
-    
+
+# Run startup and the status poll in the background so the server accepts
+# connections immediately. Started at import time so they also run under
+# Gunicorn, where the __main__ block below never executes.
+socketio.start_background_task(_startup)
+socketio.start_background_task(_poll_ollama)
+
+if __name__ == '__main__':
+    logger.info("🚀 Starting Ollama Chat Server...")
+
     # Start the server
     logger.info(f"Starting server on port 5000")
     socketio.run(app, host='0.0.0.0', port=5000, debug=False, allow_unsafe_werkzeug=True)
\ No newline at end of file
@@ -0,0 +1,70 @@
+import hashlib
+import threading
+import time
+
+import orjson
+
+# Cached responses live for 4 hours
+DEFAULT_TTL = 4 * 60 * 60
+
+
+def cache_key(model, prompt, options):
+    """Build a stable key for one (model, normalized prompt, options) combo"""
+    raw = orjson.dumps(
+        {"m": model, "p": prompt.strip().lower(), "o": options},
+        option=orjson.OPT_SORT_KEYS
+    )
+    return "llmcache:" + hashlib.sha256(raw).hexdigest()
+
+
+class LLMCache:
+    """Exact-match cache for LLM responses.
+
+    Uses Redis when a client is provided, so hits survive restarts and are
+    shared across workers; otherwise falls back to a small bounded
+    in-process dict with per-entry expiry.
+    """
+
+    def __init__(self, redis_client=None, ttl=DEFAULT_TTL, max_local_entries=256):
+        self.redis = redis_client
+        self.ttl = ttl
+        self.max_local_entries = max_local_entries
+        self._local = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached response text, or None on a miss"""
+        if self.redis is not None:
+            try:
+                cached = self.redis.get(key)
+                if cached is not None:
+                    return cached.decode()
+            except Exception:
+                pass
+            return None
+
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is None:
+                return None
+            expires_at, text = entry
+            if time.monotonic() >= expires_at:
+                del self._local[key]
+                return None
+            return text
+
+    def set(self, key, text):
+        """Store a generated response under key"""
+        if self.redis is not None:
+            try:
+                self.redis.setex(key, self.ttl, text)
+            except Exception:
+                pass
+            return
+
+        with self._lock:
+            if len(self._local) >= self.max_local_entries:
+                # Evict the entry closest to expiry to stay bounded
+                oldest = min(self._local, key=lambda k: self._local[k][0])
+                del self._local[oldest]
+            self._local[key] = (time.monotonic() + self.ttl, text)
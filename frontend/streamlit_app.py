@@ -1,8 +1,11 @@
 import streamlit as st
 import socketio
+import collections
 import queue
 import time
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from dotenv import load_dotenv
 import os
 
@@ -23,10 +26,22 @@ BACKEND_HOST = os.environ.get('BACKEND_HOST', 'localhost')
 BACKEND_PORT = os.environ.get('BACKEND_PORT', '5000')
 SERVER_URL = f"http://{BACKEND_HOST}:{BACKEND_PORT}"
 
+# --- Persistent HTTP session to the backend (keep-alive, pooled) ---
+if 'backend_session' not in st.session_state:
+    session = requests.Session()
+    session.mount("http://", HTTPAdapter(
+        pool_connections=2,
+        pool_maxsize=4,
+        max_retries=Retry(total=1, backoff_factor=0.2)
+    ))
+    st.session_state.backend_session = session
+
+BACKEND = st.session_state.backend_session
+
 # --- Fetch existing rooms via REST once ---
 if 'rooms_list' not in st.session_state:
     try:
-        resp = requests.get(f"{SERVER_URL}/rooms")
+        resp = BACKEND.get(f"{SERVER_URL}/rooms")
         resp.raise_for_status()
         # server returns dict: {room: {user_count, users}, ...}
         st.session_state.rooms_list = list(resp.json().keys())
@@ -67,6 +82,29 @@ def on_message(data):
         'timestamp': data.get('timestamp', '')
     })
 
+@sio.on('message_start')
+def on_message_start(data):
+    msg_queue.put({
+        'type': 'ai_start',
+        'id': data.get('id'),
+        'username': data.get('username', 'AI Assistant'),
+        'timestamp': data.get('timestamp', '')
+    })
+
+@sio.on('message_chunk')
+def on_message_chunk(data):
+    msg_queue.put({'type': 'ai_chunk', 'id': data.get('id'), 'token': data.get('token', '')})
+
+@sio.on('message_end')
+def on_message_end(data):
+    msg_queue.put({
+        'type': 'ai_end',
+        'id': data.get('id'),
+        'username': data.get('username', 'AI Assistant'),
+        'message': data.get('message', ''),
+        'timestamp': data.get('timestamp', '')
+    })
+
 @sio.on('user_joined')
 def on_user_joined(data):
     msg_queue.put({'type': 'system', 'message': f"👤 {data['username']} joined."})
@@ -92,7 +130,11 @@ def init_state():
         'room': st.session_state.rooms_list[0] if st.session_state.rooms_list else 'general',
         'connected': False,
         'participants': [],
-        'incoming_messages': []
+        # deque evicts old messages in O(1) instead of re-slicing the list
+        'incoming_messages': collections.deque(maxlen=150),
+        # Streamed AI messages still open, keyed by the server's message id
+        # so chunks land in the right bubble even when other messages arrive
+        'ai_streams': {}
     }
     for key, val in defaults.items():
         if key not in st.session_state:
@@ -100,20 +142,36 @@ def init_state():
 
 init_state()
 
-# --- Backend health checks ---
+# Cap work per rerun so a flood of queued events can't stall the script
+MAX_EVENTS_PER_RERUN = 200
+
+def _format_msg(msg):
+    """Precompute the rendered markdown line for one message"""
+    ts = ''
+    if t := msg.get('timestamp', ''):
+        if 'T' in t:
+            hh_mm = ':'.join(t.split('T')[-1].split(':')[:2])
+            ts = f"[{hh_mm}]"
+    name = msg.get('username', 'System')
+    icon = '🤖' if msg['type'] == 'ai' else ''
+    return f"*{ts}* **{icon + name}**: {msg.get('message', '')}"
+
+# --- Backend health checks (cached so every rerun isn't an HTTP call) ---
+@st.cache_data(ttl=5, show_spinner=False)
 def check_backend_status():
     """Check if backend is running"""
     try:
-        response = requests.get(f"{SERVER_URL}/health", timeout=5)
+        response = BACKEND.get(f"{SERVER_URL}/health", timeout=1.5)
         return response.status_code == 200
     except Exception as e:
         print(f"Backend check failed: {e}")
         return False
 
+@st.cache_data(ttl=5, show_spinner=False)
 def check_ollama_status():
     """Check Ollama status through backend"""
     try:
-        response = requests.get(f"{SERVER_URL}/ollama-status", timeout=5)
+        response = BACKEND.get(f"{SERVER_URL}/ollama-status", timeout=1.5)
         if response.status_code == 200:
             return response.json()
         return None
@@ -145,9 +203,14 @@ with st.sidebar:
     with col3:
         if st.session_state.connected:
                 st.success("🟢 Connected")
-        else:        
+        else:
             st.warning("🟡 Disconnected")
-        
+
+    if st.button("Recheck"):
+        check_backend_status.clear()
+        check_ollama_status.clear()
+        st.rerun()
+
     st.divider()
     
     if not st.session_state.connected:
@@ -191,9 +254,12 @@ with st.sidebar:
     st.markdown("Made with ❤️ by Priyank Bansal")
 
 
-# --- Process queued events ---
-while not msg_queue.empty():
-    evt = msg_queue.get()
+# --- Process queued events (bounded batch per rerun) ---
+for _ in range(MAX_EVENTS_PER_RERUN):
+    try:
+        evt = msg_queue.get_nowait()
+    except queue.Empty:
+        break
     if evt['type'] == 'update_rooms_list':
         st.session_state.rooms_list = evt['rooms']
         # preserve selection if possible
@@ -201,9 +267,47 @@ while not msg_queue.empty():
             st.session_state.room = st.session_state.rooms_list[0]
     elif evt['type'] == 'update_participants':
         st.session_state.participants = evt['users']
+    elif evt['type'] == 'ai_start':
+        # Open an empty AI message that streamed tokens will fill in,
+        # registered under its id so chunks find it later
+        msg = {
+            'type': 'ai',
+            'username': evt.get('username', 'AI Assistant'),
+            'message': '',
+            'timestamp': evt.get('timestamp', '')
+        }
+        msg['rendered'] = _format_msg(msg)
+        st.session_state.incoming_messages.append(msg)
+        st.session_state.ai_streams[evt.get('id')] = msg
+    elif evt['type'] == 'ai_chunk':
+        msg = st.session_state.ai_streams.get(evt.get('id'))
+        if msg is None:
+            # Chunk for a stream we never saw start (e.g. joined mid-stream)
+            msg = {'type': 'ai', 'username': 'AI Assistant', 'message': '', 'timestamp': ''}
+            st.session_state.incoming_messages.append(msg)
+            st.session_state.ai_streams[evt.get('id')] = msg
+        msg['message'] += evt.get('token', '')
+        msg['rendered'] = _format_msg(msg)
+    elif evt['type'] == 'ai_end':
+        # Reconcile with the full text in case any chunks were missed,
+        # and close out the stream
+        msg = st.session_state.ai_streams.pop(evt.get('id'), None)
+        if msg is None:
+            msg = {'type': 'ai', 'username': evt.get('username', 'AI Assistant'), 'message': '', 'timestamp': ''}
+            st.session_state.incoming_messages.append(msg)
+        msg['message'] = evt.get('message', '')
+        msg['timestamp'] = evt.get('timestamp', '')
+        msg['rendered'] = _format_msg(msg)
     else:
-        st.session_state.incoming_messages.append(evt)
-        st.session_state.incoming_messages = st.session_state.incoming_messages[-150:]  # keep last 100 messages
+        msgs = st.session_state.incoming_messages
+        if (msgs and evt['type'] == 'user' and msgs[-1]['type'] == 'user'
+                and msgs[-1].get('username') == evt.get('username')):
+            # Coalesce consecutive messages from the same user into one block
+            msgs[-1]['message'] += '  \n' + evt.get('message', '')
+            msgs[-1]['rendered'] = _format_msg(msgs[-1])
+        else:
+            evt['rendered'] = _format_msg(evt)
+            msgs.append(evt)
 
 # --- Display participants ---
 if st.session_state.connected and sio.connected:
@@ -249,16 +353,7 @@ with col3:
             - Cross-platform
         """)
 
-# --- Render chat messages ---
+# --- Render chat messages as one markdown block from precomputed lines ---
 with chat_area.container():
-    for msg in st.session_state.incoming_messages:
-        ts = ''
-        if t := msg.get('timestamp', ''):
-            if 'T' in t:
-                hh_mm = ':'.join(t.split('T')[-1].split(':')[:2])
-                ts = f"[{hh_mm}]"
-        name = msg.get('username', 'System')
-        text = msg.get('message', '')
-        icon = '🤖' if msg['type'] == 'ai' else ''
-        st.markdown(f"*{ts}* **{icon + name}**: {text}")
+    st.markdown("\n\n".join(msg['rendered'] for msg in st.session_state.incoming_messages))
 # --- Footer ---
\ No newline at end of file